@@ -50,7 +50,7 @@ export class PiConnectionError extends Error {
   }
 }
 
-// GPIO pin mapping (must match pi-backend/main.py GPIO_PINS)
+// GPIO pin mapping (must match pi-backend/sprinkler_core.py GPIO_PINS)
 const GPIO_PINS = [12, 16, 20, 21, 26, 19, 13, 6, 5, 11, 9, 10, 22, 27, 17, 4];
 
 export class PiApiClient {
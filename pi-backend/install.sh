@@ -32,8 +32,11 @@ cd "$INSTALL_DIR"
 if [ "$CURRENT_DIR" != "$INSTALL_DIR" ]; then
     echo "📋 Copying backend files..."
     cp "$CURRENT_DIR/main.py" . 2>/dev/null || echo "main.py not found in current directory"
+    cp "$CURRENT_DIR/sprinkler_core.py" . 2>/dev/null || echo "sprinkler_core.py not found"
+    cp "$CURRENT_DIR/setup.py" . 2>/dev/null || echo "setup.py not found"
     cp "$CURRENT_DIR/requirements.txt" . 2>/dev/null || echo "requirements.txt not found"
     cp "$CURRENT_DIR/sprinkler.service" . 2>/dev/null || echo "sprinkler.service not found"
+    cp "$CURRENT_DIR/pigpiod-override.conf" . 2>/dev/null || echo "pigpiod-override.conf not found"
 fi
 
 # Update system packages
@@ -43,16 +46,21 @@ sudo apt upgrade -y
 
 # Install Python 3 and pip if not present
 echo "🐍 Installing Python dependencies..."
-sudo apt install -y python3 python3-pip python3-venv
+sudo apt install -y python3 python3-pip python3-venv python3-dev build-essential
 
 # Install pigpio
 echo "🔌 Installing pigpio for GPIO control..."
 sudo apt install -y pigpio python3-pigpio
 
-# Enable and start pigpio daemon
+# Enable and start pigpio daemon (alerts/sampling disabled - outputs only)
 echo "⚙️  Configuring pigpio daemon..."
+if [ -f pigpiod-override.conf ]; then
+    sudo mkdir -p /etc/systemd/system/pigpiod.service.d
+    sudo cp pigpiod-override.conf /etc/systemd/system/pigpiod.service.d/override.conf
+    sudo systemctl daemon-reload
+fi
 sudo systemctl enable pigpiod
-sudo systemctl start pigpiod
+sudo systemctl restart pigpiod
 
 # Create Python virtual environment
 echo "🌍 Creating Python virtual environment..."
@@ -64,6 +72,16 @@ echo "📚 Installing Python packages..."
 pip install --upgrade pip
 pip install -r requirements.txt
 
+# Compile the GPIO core with mypyc (optional - pure Python is used if this fails)
+echo "⚡ Compiling sprinkler core with mypyc..."
+# Drop any previous build first so a stale extension never shadows new source
+rm -rf build sprinkler_core*.so *__mypyc*.so
+if pip install mypy==1.7.1 && python setup.py build_ext --inplace; then
+    echo "✅ Compiled sprinkler core installed"
+else
+    echo "⚠️  mypyc build failed, using pure-Python sprinkler core"
+fi
+
 # Install systemd service
 echo "🔄 Installing systemd service..."
 sudo cp sprinkler.service /etc/systemd/system/
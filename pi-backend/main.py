@@ -5,48 +5,62 @@ FastAPI server for controlling sprinkler zones via GPIO pins
 """
 
 import os
+import hmac
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Body, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+from starlette.datastructures import Headers
 import uvicorn
 
-# GPIO control - handles both real hardware and simulation
+# GPIO control - compiled with mypyc when built (see setup.py), else pure Python
+from sprinkler_core import (
+    GPIO_PINS,
+    DENIED_PINS,
+    GPIO_PINS_SET,
+    DENIED_PINS_SET,
+    active_timers,
+    gpio,
+    turn_on,
+    turn_off,
+    stop_all,
+)
+
+# Fast event loop and HTTP parser - shipped with uvicorn[standard]
+try:
+    import uvloop  # noqa: F401
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
+
 try:
-    import pigpio
-    HAS_PIGPIO = True
+    import httptools  # noqa: F401
+    HAS_HTTPTOOLS = True
 except ImportError:
-    HAS_PIGPIO = False
-    print("Warning: pigpio not available. Running in simulation mode.")
+    HAS_HTTPTOOLS = False
+
+logger = logging.getLogger(__name__)
 
 # Configuration
 SPRINKLER_API_TOKEN = os.getenv("SPRINKLER_API_TOKEN", "")
+SPRINKLER_API_TOKEN_BYTES = SPRINKLER_API_TOKEN.encode()
 DEFAULT_PORT = int(os.getenv("PORT", "8000"))
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:5000,https://localhost:5000").split(",")
-GPIO_PINS = [12, 16, 20, 21, 26, 19, 13, 6, 5, 11, 9, 10, 22, 27, 17, 4]
-DENIED_PINS = [2, 3, 14, 15, 18]  # Critical system pins to avoid (removed pin 4 conflict)
-
-# Global state
-pi = None
-pin_states: Dict[int, str] = {}
-active_timers: Dict[int, asyncio.Task] = {}
 
 # Security
 security = HTTPBearer(auto_error=False)
 
-# Authentication dependency
-async def verify_auth_token(authorization: HTTPAuthorizationCredentials = Depends(security)):
+# Authentication dependencies
+async def check_auth_token(authorization: HTTPAuthorizationCredentials = Depends(security)) -> bool:
     """Verify authentication token for mutating endpoints"""
-    # If no token is configured, skip authentication (for local development)
-    if not SPRINKLER_API_TOKEN:
-        return True
-    
     if not authorization:
         raise HTTPException(
             status_code=401,
@@ -54,7 +68,8 @@ async def verify_auth_token(authorization: HTTPAuthorizationCredentials = Depend
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if authorization.credentials != SPRINKLER_API_TOKEN:
+    # Constant-time comparison to avoid leaking the token through timing
+    if not hmac.compare_digest(authorization.credentials.encode(), SPRINKLER_API_TOKEN_BYTES):
         raise HTTPException(
             status_code=401,
             detail="Invalid API token",
@@ -63,266 +78,215 @@ async def verify_auth_token(authorization: HTTPAuthorizationCredentials = Depend
     
     return True
 
+async def skip_auth_token() -> bool:
+    """No-op authentication when no token is configured"""
+    return True
+
+# If no token is configured, skip authentication (for local development);
+# the choice is made once so unauthenticated setups never run HTTPBearer
+verify_auth_token: Callable[..., Awaitable[bool]]
+if SPRINKLER_API_TOKEN:
+    verify_auth_token = check_auth_token
+else:
+    verify_auth_token = skip_auth_token
+
 # Models
 class PinControlRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     duration: Optional[int] = Field(10, description="Duration in minutes for auto-off (default: 10 minutes)")
 
 class PinStatus(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     id: int
     name: str
     enabled: bool
     state: str  # 'on' or 'off'
 
 class SystemStatus(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     ok: bool
-    pins: List[int]
+    pins: list[int]
     allow_mode: str
-    deny: List[int]
+    deny: list[int]
     backend: str
     pigpio_connected: bool
 
 class PinControlResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     pin: int
     state: str
     success: bool
     message: Optional[str] = None
 
-# GPIO Control Class
-class GPIOController:
-    def __init__(self):
-        self.pi = None
-        self.connected = False
-        
-    async def initialize(self):
-        """Initialize GPIO connection"""
-        if HAS_PIGPIO:
-            try:
-                self.pi = pigpio.pi()
-                if self.pi.connected:
-                    self.connected = True
-                    # Set all sprinkler pins to output mode, initially off
-                    for pin in GPIO_PINS:
-                        self.pi.set_mode(pin, pigpio.OUTPUT)
-                        self.pi.write(pin, 0)  # Start with all zones off
-                        pin_states[pin] = 'off'
-                    logging.info(f"GPIO initialized. Connected pins: {GPIO_PINS}")
-                else:
-                    logging.error("Failed to connect to pigpio daemon")
-            except Exception as e:
-                logging.error(f"GPIO initialization failed: {e}")
-        else:
-            # Simulation mode
-            self.connected = False
-            for pin in GPIO_PINS:
-                pin_states[pin] = 'off'
-            logging.info("Running in simulation mode (no pigpio)")
-    
-    async def cleanup(self):
-        """Cleanup GPIO connections"""
-        if self.pi and self.connected:
-            # Turn off all pins before cleanup
-            for pin in GPIO_PINS:
-                self.pi.write(pin, 0)
-            self.pi.stop()
-            
-        # Cancel any active timers
-        for task in active_timers.values():
-            if not task.done():
-                task.cancel()
-        active_timers.clear()
-    
-    def set_pin(self, pin: int, state: bool) -> bool:
-        """Set pin state (True = on, False = off)"""
-        if pin not in GPIO_PINS:
-            raise ValueError(f"Pin {pin} not in allowed pins list")
-            
-        if self.pi and self.connected:
-            try:
-                self.pi.write(pin, 1 if state else 0)
-                pin_states[pin] = 'on' if state else 'off'
-                logging.info(f"Pin {pin} set to {'ON' if state else 'OFF'}")
-                return True
-            except Exception as e:
-                logging.error(f"Failed to set pin {pin}: {e}")
-                return False
-        else:
-            # Simulation mode
-            pin_states[pin] = 'on' if state else 'off'
-            logging.info(f"[SIMULATION] Pin {pin} set to {'ON' if state else 'OFF'}")
-            return True
-    
-    def get_pin_state(self, pin: int) -> str:
-        """Get current pin state"""
-        return pin_states.get(pin, 'off')
-    
-    def get_all_pins(self) -> List[PinStatus]:
-        """Get status of all pins"""
-        pins = []
-        for i, pin in enumerate(GPIO_PINS):
-            pins.append(PinStatus(
-                id=pin,
-                name=f"Zone {i + 1}",
-                enabled=pin not in DENIED_PINS,
-                state=self.get_pin_state(pin)
-            ))
-        return pins
-
-# Initialize GPIO controller
-gpio = GPIOController()
+# Precomputed response payloads - pin layout is fixed for the process lifetime
+STATUS_PAYLOADS = {
+    connected: SystemStatus(
+        ok=True,
+        pins=GPIO_PINS,
+        allow_mode="whitelist",
+        deny=DENIED_PINS,
+        backend="pigpio" if connected else "simulation",
+        pigpio_connected=connected
+    ).model_dump()
+    for connected in (True, False)
+}
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifespan"""
     # Startup
     await gpio.initialize()
-    logging.info("Sprinkler GPIO backend started")
+    logger.info("Sprinkler GPIO backend started")
     yield
     # Shutdown
     await gpio.cleanup()
-    logging.info("Sprinkler GPIO backend stopped")
+    logger.info("Sprinkler GPIO backend stopped")
 
 # Create FastAPI app
 app = FastAPI(
     title="Sprinkler GPIO Control",
     description="Raspberry Pi GPIO control for sprinkler zones",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+class CachedCORSMiddleware(CORSMiddleware):
+    """CORS middleware with set-based lookups and prebuilt preflight responses"""
+    
+    def __init__(self, app, **kwargs):
+        super().__init__(app, **kwargs)
+        self.allow_origins = frozenset(origin.strip() for origin in self.allow_origins)
+        self.allow_methods = frozenset(self.allow_methods)
+        self.allow_headers = frozenset(self.allow_headers)
+        
+        # One ready-to-send preflight response per allowed origin; wildcard
+        # configurations need per-request headers and use the stock path
+        self.preflight_cache: dict[str, Response] = {}
+        if self.preflight_explicit_allow_origin and not self.allow_all_headers:
+            self.preflight_cache = {
+                origin: PlainTextResponse(
+                    "OK",
+                    headers={**self.preflight_headers, "Access-Control-Allow-Origin": origin}
+                )
+                for origin in self.allow_origins
+            }
+    
+    def preflight_response(self, request_headers: Headers) -> Response:
+        cached = self.preflight_cache.get(request_headers["origin"])
+        requested_headers = request_headers.get("access-control-request-headers")
+        if (
+            cached is not None
+            and request_headers["access-control-request-method"] in self.allow_methods
+            and (
+                requested_headers is None
+                or all(h.strip().lower() in self.allow_headers for h in requested_headers.split(","))
+            )
+        ):
+            return cached
+        # Rejections (and wildcard setups) build their response as usual
+        return super().preflight_response(request_headers)
+
 # CORS middleware with restricted origins
 app.add_middleware(
-    CORSMiddleware,
+    CachedCORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,  # Restricted to specific origins for security
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],  # Only necessary methods
     allow_headers=["Content-Type", "Authorization", "Accept"],  # Only necessary headers
 )
 
-# Auto-off timer function
-async def auto_off_timer(pin: int, duration_minutes: int):
-    """Turn off pin after specified duration"""
-    try:
-        await asyncio.sleep(duration_minutes * 60)
-        gpio.set_pin(pin, False)
-        logging.info(f"Auto-off: Pin {pin} turned off after {duration_minutes} minutes")
-        
-        # Remove timer from active list
-        if pin in active_timers:
-            del active_timers[pin]
-            
-    except asyncio.CancelledError:
-        logging.info(f"Auto-off timer for pin {pin} was cancelled")
+# API Endpoints - read-only routes are public, mutating routes get the auth
+# dependency once at router level
+public_router = APIRouter()
+auth_router = APIRouter(dependencies=[Depends(verify_auth_token)])
 
-# API Endpoints
+# Prebuilt rejection responses, returned as-is for invalid pins. A shared
+# HTTPException can't be reused the same way: its __traceback__ grows on
+# every raise
+PIN_NOT_AVAILABLE = ORJSONResponse({"detail": "Pin not available"}, status_code=404)
+PIN_DENIED = ORJSONResponse({"detail": "Pin is denied for safety"}, status_code=403)
 
-@app.get("/api/status", response_model=SystemStatus)
+# Hot endpoints build their payloads server-side and return ORJSONResponse
+# directly, skipping response_model validation and jsonable_encoder; the
+# models are kept in the OpenAPI docs via `responses`
+@public_router.get("/api/status", responses={200: {"model": SystemStatus}})
 async def get_system_status():
     """Get system status and configuration"""
-    return SystemStatus(
-        ok=True,
-        pins=GPIO_PINS,
-        allow_mode="whitelist",
-        deny=DENIED_PINS,
-        backend="pigpio" if gpio.connected else "simulation",
-        pigpio_connected=gpio.connected
-    )
+    return ORJSONResponse(STATUS_PAYLOADS[gpio.connected])
 
-@app.get("/api/pins", response_model=List[PinStatus])
+@public_router.get("/api/pins", responses={200: {"model": list[PinStatus]}})
 async def get_pins():
     """Get status of all GPIO pins"""
-    return gpio.get_all_pins()
+    return ORJSONResponse(gpio.get_all_pins())
 
-@app.get("/api/pin/{pin}")
+@public_router.get("/api/pin/{pin}")
 async def get_pin_status(pin: int):
     """Get status of specific pin"""
-    if pin not in GPIO_PINS:
-        raise HTTPException(status_code=404, detail=f"Pin {pin} not found")
+    if pin not in GPIO_PINS_SET:
+        return PIN_NOT_AVAILABLE
     
     return {
         "pin": pin,
         "state": gpio.get_pin_state(pin),
-        "enabled": pin not in DENIED_PINS
+        "enabled": pin not in DENIED_PINS_SET
     }
 
-@app.post("/api/pin/{pin}/on", response_model=PinControlResponse)
-async def turn_pin_on(
-    pin: int, 
-    request: PinControlRequest = PinControlRequest(), 
-    background_tasks: BackgroundTasks = None,
-    authenticated: bool = Depends(verify_auth_token)
-):
+@auth_router.post("/api/pin/{pin}/on", responses={200: {"model": PinControlResponse}})
+async def turn_pin_on(pin: int, request: Optional[PinControlRequest] = Body(None)):
     """Turn on a GPIO pin with optional auto-off timer"""
-    if pin not in GPIO_PINS:
-        raise HTTPException(status_code=404, detail=f"Pin {pin} not available")
-    
-    if pin in DENIED_PINS:
-        raise HTTPException(status_code=403, detail=f"Pin {pin} is denied for safety")
+    if pin not in GPIO_PINS_SET:
+        return PIN_NOT_AVAILABLE
     
-    # Cancel any existing timer for this pin
-    if pin in active_timers:
-        active_timers[pin].cancel()
-        del active_timers[pin]
+    if pin in DENIED_PINS_SET:
+        return PIN_DENIED
     
-    # Turn on the pin
-    success = gpio.set_pin(pin, True)
+    # Turn on the pin with an auto-off timer (use provided duration or default 10 minutes)
+    duration = request.duration if request and request.duration and request.duration > 0 else 10
+    success = await turn_on(pin, duration)
     
     if not success:
         raise HTTPException(status_code=500, detail="Failed to control GPIO pin")
     
-    message = f"Pin {pin} turned on"
-    
-    # Set up auto-off timer (use provided duration or default 10 minutes)
-    duration = request.duration if request.duration and request.duration > 0 else 10
-    timer_task = asyncio.create_task(auto_off_timer(pin, duration))
-    active_timers[pin] = timer_task
-    message += f" for {duration} minutes"
+    message = f"Pin {pin} turned on for {duration} minutes"
     
-    return PinControlResponse(
-        pin=pin,
-        state='on',
-        success=True,
-        message=message
-    )
+    return ORJSONResponse({
+        "pin": pin,
+        "state": 'on',
+        "success": True,
+        "message": message
+    })
 
-@app.post("/api/pin/{pin}/off", response_model=PinControlResponse)
-async def turn_pin_off(pin: int, authenticated: bool = Depends(verify_auth_token)):
+@auth_router.post("/api/pin/{pin}/off", responses={200: {"model": PinControlResponse}})
+async def turn_pin_off(pin: int):
     """Turn off a GPIO pin"""
-    if pin not in GPIO_PINS:
-        raise HTTPException(status_code=404, detail=f"Pin {pin} not available")
+    if pin not in GPIO_PINS_SET:
+        return PIN_NOT_AVAILABLE
     
-    # Cancel any existing timer for this pin
-    if pin in active_timers:
-        active_timers[pin].cancel()
-        del active_timers[pin]
-    
-    # Turn off the pin
-    success = gpio.set_pin(pin, False)
+    # Turn off the pin and cancel any existing timer for it
+    success = await turn_off(pin)
     
     if not success:
         raise HTTPException(status_code=500, detail="Failed to control GPIO pin")
     
-    return PinControlResponse(
-        pin=pin,
-        state='off',
-        success=True,
-        message=f"Pin {pin} turned off"
-    )
+    return ORJSONResponse({
+        "pin": pin,
+        "state": 'off',
+        "success": True,
+        "message": f"Pin {pin} turned off"
+    })
 
-@app.post("/api/emergency-stop")
-async def emergency_stop(authenticated: bool = Depends(verify_auth_token)):
+@auth_router.post("/api/emergency-stop")
+async def emergency_stop():
     """Turn off all pins immediately"""
-    stopped_pins = []
-    
-    # Cancel all timers
-    for pin, task in active_timers.items():
-        task.cancel()
-    active_timers.clear()
-    
-    # Turn off all pins
-    for pin in GPIO_PINS:
-        if gpio.get_pin_state(pin) == 'on':
-            gpio.set_pin(pin, False)
-            stopped_pins.append(pin)
+    # Turn off all pins in one bank write, then cancel all timers
+    stopped_pins = await stop_all()
+    if stopped_pins is None:
+        raise HTTPException(status_code=500, detail="Failed to control GPIO pins")
     
     return {
         "success": True,
@@ -330,27 +294,45 @@ async def emergency_stop(authenticated: bool = Depends(verify_auth_token)):
         "stopped_pins": stopped_pins
     }
 
-@app.get("/health")
+# Health check timestamp, rebuilt at most once per second
+_health_second: int = 0
+_health_iso: str = ""
+
+def current_timestamp() -> str:
+    """Get the current local time as an ISO string with one-second resolution"""
+    global _health_second, _health_iso
+    now = int(time.time())
+    if now != _health_second:
+        _health_second = now
+        _health_iso = datetime.fromtimestamp(now).isoformat()
+    return _health_iso
+
+@public_router.get("/health")
 async def health_check():
     """Simple health check endpoint"""
     return {
         "status": "ok",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": current_timestamp(),
         "gpio_connected": gpio.connected
     }
 
 # Development/debugging endpoints
-@app.get("/api/debug/timers")
+@public_router.get("/api/debug/timers")
 async def get_active_timers():
     """Get information about active auto-off timers"""
     timer_info = {}
-    for pin, task in active_timers.items():
+    loop = asyncio.get_running_loop()
+    for pin, handle in active_timers.items():
         timer_info[pin] = {
-            "active": not task.done(),
-            "cancelled": task.cancelled()
+            "active": not handle.cancelled(),
+            "cancelled": handle.cancelled(),
+            "remaining_seconds": max(0.0, round(handle.when() - loop.time(), 1))
         }
     return timer_info
 
+app.include_router(public_router)
+app.include_router(auth_router)
+
 if __name__ == "__main__":
     # Configure logging
     logging.basicConfig(
@@ -364,5 +346,8 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=DEFAULT_PORT,
         reload=False,  # Disable in production
-        access_log=True
+        access_log=True,
+        # Single worker only: GPIO state and auto-off timers live in-process
+        loop="uvloop" if HAS_UVLOOP else "asyncio",
+        http="httptools" if HAS_HTTPTOOLS else "h11",
     )
\ No newline at end of file
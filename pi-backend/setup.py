@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Optional mypyc build of the sprinkler GPIO core
+
+    pip install mypy==1.7.1
+    python setup.py build_ext --inplace
+
+The compiled extension is placed next to sprinkler_core.py and imported in
+its place; without it the pure-Python module is used unchanged. Because the
+extension takes precedence, rebuild it after every edit to sprinkler_core.py
+(or delete sprinkler_core*.so), otherwise the old compiled code keeps running.
+"""
+
+from setuptools import setup
+from mypyc.build import mypycify
+
+setup(
+    name="sprinkler-core",
+    py_modules=[],
+    ext_modules=mypycify(["sprinkler_core.py"]),
+)
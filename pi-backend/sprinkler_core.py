@@ -0,0 +1,302 @@
+"""
+Sprinkler GPIO core - pin configuration, state and auto-off timers
+Kept free of FastAPI so it can be compiled with mypyc (see setup.py);
+the pure-Python module is used unchanged when no compiled build exists
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+from typing import Any, Optional
+
+# GPIO logger - set GPIO_LOG_LEVEL=WARNING to skip per-toggle INFO records
+logger = logging.getLogger(__name__)
+if os.getenv("GPIO_LOG_LEVEL"):
+    try:
+        logger.setLevel(os.environ["GPIO_LOG_LEVEL"].upper())
+    except ValueError:
+        # A typo must not crash startup (and loop under Restart=always)
+        logger.warning("Ignoring unknown GPIO_LOG_LEVEL %r", os.environ["GPIO_LOG_LEVEL"])
+
+# GPIO control - handles both real hardware and simulation
+try:
+    import pigpio  # type: ignore
+    HAS_PIGPIO = True
+except ImportError:
+    HAS_PIGPIO = False
+    print("Warning: pigpio not available. Running in simulation mode.")
+
+# Configuration
+GPIO_PINS = [12, 16, 20, 21, 26, 19, 13, 6, 5, 11, 9, 10, 22, 27, 17, 4]
+DENIED_PINS = [2, 3, 14, 15, 18]  # Critical system pins to avoid (removed pin 4 conflict)
+# Set views for O(1) membership checks; the lists above keep API ordering
+GPIO_PINS_SET = frozenset(GPIO_PINS)
+DENIED_PINS_SET = frozenset(DENIED_PINS)
+# Bank 1 bitmask covering every sprinkler pin, for single-command bank writes
+GPIO_MASK = sum(1 << pin for pin in GPIO_PINS)
+# Seconds an API call waits for the writer thread to confirm a GPIO write
+GPIO_WRITE_TIMEOUT = 5.0
+
+# Precomputed zone layout - fixed for the process lifetime
+PIN_STATUS_TEMPLATE: list[dict[str, Any]] = [
+    {"id": pin, "name": f"Zone {i + 1}", "enabled": pin not in DENIED_PINS_SET}
+    for i, pin in enumerate(GPIO_PINS)
+]
+
+# Global state
+active_timers: dict[int, asyncio.TimerHandle] = {}
+
+# GPIO Control Class
+class GPIOController:
+    def __init__(self) -> None:
+        self.pi: Any = None
+        self.connected = False
+        # Pin states packed as a bank 1 level mask: bit (1 << pin) set = on.
+        # Only ever written on the event loop thread, and only with confirmed
+        # hardware results
+        self.state_mask = 0
+        # Pending (bitmask, state, future) bank writes, applied by the writer
+        # thread; None is the shutdown sentinel
+        self.write_queue: "queue.SimpleQueue[Optional[tuple[int, bool, asyncio.Future[bool]]]]" = queue.SimpleQueue()
+        self.writer: Optional[threading.Thread] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def initialize(self) -> None:
+        """Initialize GPIO connection"""
+        if HAS_PIGPIO:
+            try:
+                self.pi = pigpio.pi()
+                if self.pi.connected:
+                    self.connected = True
+                    # Set all sprinkler pins to output mode, initially off
+                    for pin in GPIO_PINS:
+                        self.pi.set_mode(pin, pigpio.OUTPUT)
+                    self.pi.clear_bank_1(GPIO_MASK)  # Start with all zones off
+                    self.state_mask = 0
+                    self.loop = asyncio.get_running_loop()
+                    self.writer = threading.Thread(
+                        target=self._writer_loop, name="gpio-writer", daemon=True
+                    )
+                    self.writer.start()
+                    logger.info("GPIO initialized. Connected pins: %s", GPIO_PINS)
+                else:
+                    logger.error("Failed to connect to pigpio daemon")
+            except Exception as e:
+                logger.error("GPIO initialization failed: %s", e)
+        else:
+            # Simulation mode
+            self.connected = False
+            self.state_mask = 0
+            logger.info("Running in simulation mode (no pigpio)")
+
+    async def cleanup(self) -> None:
+        """Cleanup GPIO connections"""
+        if self.pi and self.connected:
+            # Let the writer drain pending writes, then turn off all pins
+            if self.writer:
+                self.write_queue.put_nowait(None)
+                await asyncio.to_thread(self.writer.join, 5)
+            self.pi.clear_bank_1(GPIO_MASK)
+            self.pi.stop()
+
+        # Cancel any active timers
+        cancel_all_auto_off_timers()
+
+    def request_pin(self, pin: int, state: bool) -> "asyncio.Future[bool]":
+        """Queue a pin write; the future resolves to True once it is applied"""
+        if pin not in GPIO_PINS_SET:
+            raise ValueError(f"Pin {pin} not in allowed pins list")
+
+        if self.connected:
+            logger.info("Pin %s set to %s", pin, 'ON' if state else 'OFF')
+        else:
+            logger.info("[SIMULATION] Pin %s set to %s", pin, 'ON' if state else 'OFF')
+        return self._request_write(1 << pin, state)
+
+    def request_all_off(self) -> "asyncio.Future[bool]":
+        """Queue a single bank write turning off every sprinkler pin"""
+        # Queued behind any pending writes so none of them can re-enable a zone
+        if self.connected:
+            logger.info("All pins set to OFF")
+        else:
+            logger.info("[SIMULATION] All pins set to OFF")
+        return self._request_write(GPIO_MASK, False)
+
+    async def set_pin(self, pin: int, state: bool) -> bool:
+        """Set pin state (True = on, False = off); returns False if the write failed"""
+        return await self._wait(self.request_pin(pin, state))
+
+    async def set_all_off(self) -> bool:
+        """Turn off every sprinkler pin; returns False if the write failed"""
+        return await self._wait(self.request_all_off())
+
+    def _request_write(self, mask: int, state: bool) -> "asyncio.Future[bool]":
+        future: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        if self.pi and self.connected:
+            # The writer thread performs the pigpiod round-trip, so the event
+            # loop never blocks on it
+            self.write_queue.put_nowait((mask, state, future))
+        else:
+            # Simulation mode
+            self._complete_writes([future], mask if state else 0, 0 if state else mask, True, None)
+        return future
+
+    async def _wait(self, future: "asyncio.Future[bool]") -> bool:
+        try:
+            return await asyncio.wait_for(future, GPIO_WRITE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error("Timed out waiting for GPIO write")
+            return False
+
+    def _writer_loop(self) -> None:
+        """Apply queued writes, coalescing each backlog into one bank write per level"""
+        stopping = False
+        while not stopping:
+            batch = [self.write_queue.get()]
+            while True:
+                try:
+                    batch.append(self.write_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Later writes to the same pin override earlier ones
+            on_mask = off_mask = 0
+            futures: list[asyncio.Future[bool]] = []
+            for item in batch:
+                if item is None:
+                    stopping = True
+                    continue
+                mask, state, future = item
+                futures.append(future)
+                if state:
+                    on_mask |= mask
+                    off_mask &= ~mask
+                else:
+                    off_mask |= mask
+                    on_mask &= ~mask
+
+            if not futures:
+                continue
+
+            ok = True
+            levels: Optional[int] = None
+            try:
+                if off_mask:
+                    self.pi.clear_bank_1(off_mask)
+                if on_mask:
+                    self.pi.set_bank_1(on_mask)
+            except Exception as e:
+                logger.error("Failed to write GPIO bank: %s", e)
+                ok = False
+                levels = self._read_levels()
+
+            # State and futures are only touched on the event loop thread; the
+            # callbacks run in queue order, so later batches apply on top
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(
+                    self._complete_writes, futures, on_mask, off_mask, ok, levels
+                )
+
+    def _read_levels(self) -> Optional[int]:
+        """Read hardware levels after a failed write (writer thread only)"""
+        try:
+            levels: int = self.pi.read_bank_1()
+            return levels
+        except Exception as e:
+            logger.error("Failed to read GPIO bank: %s", e)
+            return None
+
+    def _complete_writes(
+        self,
+        futures: "list[asyncio.Future[bool]]",
+        on_mask: int,
+        off_mask: int,
+        ok: bool,
+        levels: Optional[int],
+    ) -> None:
+        """Record the outcome of a write batch (event loop thread only)"""
+        if ok:
+            self.state_mask = (self.state_mask & ~off_mask) | on_mask
+        elif levels is not None:
+            # Partial writes are possible, so trust the hardware over the request
+            self.state_mask = levels & GPIO_MASK
+        for future in futures:
+            if not future.done():
+                future.set_result(ok)
+
+    def get_pin_state(self, pin: int) -> str:
+        """Get current pin state"""
+        return 'on' if self.state_mask & (1 << pin) else 'off'
+
+    def get_all_pins(self) -> list[dict[str, Any]]:
+        """Get status of all pins"""
+        mask = self.state_mask
+        return [
+            {**zone, "state": 'on' if mask & (1 << zone["id"]) else 'off'}
+            for zone in PIN_STATUS_TEMPLATE
+        ]
+
+# Initialize GPIO controller
+gpio = GPIOController()
+
+# Auto-off timer functions - timers are plain loop.call_later handles, which
+# avoids allocating a Task and coroutine per zone activation
+def auto_off_timer(pin: int, duration_minutes: int) -> None:
+    """Turn off pin once its auto-off timer fires"""
+    # Remove timer from active list
+    active_timers.pop(pin, None)
+
+    def check(future: "asyncio.Future[bool]") -> None:
+        if future.result():
+            logger.info("Auto-off: Pin %s turned off after %s minutes", pin, duration_minutes)
+        else:
+            logger.error("Auto-off: Failed to turn off pin %s", pin)
+
+    gpio.request_pin(pin, False).add_done_callback(check)
+
+def cancel_auto_off_timer(pin: int) -> None:
+    """Cancel the pending auto-off timer for a pin, if any"""
+    handle = active_timers.pop(pin, None)
+    if handle is not None:
+        handle.cancel()
+        logger.info("Auto-off timer for pin %s was cancelled", pin)
+
+def cancel_all_auto_off_timers() -> None:
+    """Cancel every pending auto-off timer"""
+    # Snapshot and clear first so nothing observes a half-cancelled table
+    handles = list(active_timers.values())
+    active_timers.clear()
+    for handle in handles:
+        handle.cancel()
+
+# Zone control - called from the API handlers on the event loop thread. Timers
+# are only cancelled once an off write is confirmed, so a failed write keeps
+# any pending auto-off as a fallback
+async def turn_on(pin: int, duration_minutes: int) -> bool:
+    """Turn on a pin and (re)arm its auto-off timer"""
+    success = await gpio.set_pin(pin, True)
+
+    # Arm the timer even if the write failed or timed out - it may still have
+    # reached the hardware, and an extra auto-off is harmless
+    cancel_auto_off_timer(pin)
+    loop = asyncio.get_running_loop()
+    active_timers[pin] = loop.call_later(duration_minutes * 60, auto_off_timer, pin, duration_minutes)
+    return success
+
+async def turn_off(pin: int) -> bool:
+    """Turn off a pin and cancel its auto-off timer"""
+    if not await gpio.set_pin(pin, False):
+        return False
+    cancel_auto_off_timer(pin)
+    return True
+
+async def stop_all() -> Optional[list[int]]:
+    """Turn off every pin and cancel all timers; returns the pins that were on"""
+    mask = gpio.state_mask
+    stopped_pins = [pin for pin in GPIO_PINS if mask & (1 << pin)]
+    if not await gpio.set_all_off():
+        return None
+    cancel_all_auto_off_timers()
+    return stopped_pins